@@ -38,11 +38,41 @@ def clean_augment_wine(df_wine):
     logging.info("Augmentation terminée : Colonne 'year' ajoutée.")
     return df_wine
 
-def clean_aggregate_meteo(df_meteo):
+# Région attribuée aux relevés sans colonne 'region' (historique : une seule station)
+DEFAULT_REGION = "Bordeaux"
+
+# Fenêtres de saison de croissance (mois-jour de début, mois-jour de fin)
+# Hémisphère sud : la fenêtre chevauche le 1er janvier, le millésime est l'année de fin.
+GROWING_SEASON_NORTH = ("04-01", "10-31")
+GROWING_SEASON_SOUTH = ("10-01", "04-30")
+
+def _month_day(value):
+    """Convertit 'MM-JJ' en entier MMJJ (ex: '04-01' -> 401) pour des comparaisons vectorisées."""
+    month, day = value.split("-")
+    return int(month) * 100 + int(day)
+
+def _window_days(years, window):
+    """Nombre de jours attendus dans la fenêtre pour chaque millésime (années bissextiles comprises)."""
+    start_md, end_md = window if window is not None else ("01-01", "12-31")
+    crosses_year = _month_day(start_md) > _month_day(end_md)
+    start_years = years - 1 if crosses_year else years
+    start = pd.to_datetime(start_years.astype(str) + "-" + start_md)
+    end = pd.to_datetime(years.astype(str) + "-" + end_md)
+    return (end - start).dt.days + 1
+
+def clean_aggregate_meteo(df_meteo, window=None):
     """
     Nettoie et agrège les données météo.
-    - Convertit la date en année.
-    - Agrège par année : Moyenne température, Somme pluie.
+    - Convertit la date en année (millésime).
+    - Agrège par région et par année : Moyenne température, Somme pluie.
+    - window=None agrège l'année civile ; window=('MM-JJ', 'MM-JJ') se limite
+      à une fenêtre (ex: GROWING_SEASON_NORTH pour la saison de croissance).
+
+    Le DataFrame peut contenir plusieurs stations (colonnes 'station' et 'region').
+    La pluie est d'abord cumulée par station puis moyennée par région, afin que
+    le nombre de stations n'influence pas le cumul. Tout est vectorisé (groupby).
+    Les millésimes incomplets d'une station (début/fin des relevés, fenêtre à cheval
+    sur deux années) sont écartés : leur cumul de pluie serait sous-estimé.
     """
     logging.info("Début du nettoyage et agrégation des données Météo...")
     
@@ -52,16 +82,47 @@ def clean_aggregate_meteo(df_meteo):
     elif 'date' in df_meteo.columns:
         df_meteo['date'] = pd.to_datetime(df_meteo['date'])
     
-    # Extraction de l'année
-    df_meteo['year'] = df_meteo['date'].dt.year
+    # Colonnes station / région : catégorielles pour limiter la mémoire sur des millions de lignes
+    if 'region' not in df_meteo.columns:
+        df_meteo['region'] = DEFAULT_REGION
+    if 'station' not in df_meteo.columns:
+        df_meteo['station'] = df_meteo['region']
+    df_meteo['region'] = df_meteo['region'].astype('category')
+    df_meteo['station'] = df_meteo['station'].astype('category')
+
+    # Extraction de l'année (millésime)
+    dates = df_meteo['date'].dt
+    df_meteo['year'] = dates.year
+    
+    # Filtrage sur la fenêtre saisonnière (masque booléen, pas de boucle)
+    if window is not None:
+        start, end = _month_day(window[0]), _month_day(window[1])
+        month_day = dates.month * 100 + dates.day
+        if start <= end:
+            mask = (month_day >= start) & (month_day <= end)
+        else:
+            # Fenêtre à cheval sur deux années : les jours d'automne comptent pour le millésime suivant
+            mask = (month_day >= start) | (month_day <= end)
+            df_meteo['year'] = df_meteo['year'] + (month_day >= start).astype(int)
+        df_meteo = df_meteo[mask]
     
-    # Agrégation
-    df_agg = df_meteo.groupby('year').agg({
-        'temperature_2m_mean': 'mean',
-        'rain_sum': 'sum'
-    }).reset_index()
+    # Agrégation par station, puis moyenne des stations de chaque région
+    df_station = df_meteo.groupby(['region', 'station', 'year'], observed=True, sort=False).agg(
+        temperature_2m_mean=('temperature_2m_mean', 'mean'),
+        rain_sum=('rain_sum', 'sum'),
+        days=('date', 'nunique')
+    )
     
-    logging.info(f"Agrégation terminée : {len(df_agg)} années météo disponibles.")
+    # Suppression des millésimes incomplets
+    expected_days = _window_days(df_station.index.get_level_values('year').to_series(), window).to_numpy()
+    complete = df_station['days'].to_numpy() >= expected_days
+    if not complete.all():
+        logging.warning(f"{(~complete).sum()} couples station/année incomplets écartés de l'agrégation.")
+    df_station = df_station[complete].drop(columns='days')
+    
+    df_agg = df_station.groupby(level=['region', 'year'], observed=True).mean().reset_index()
+    
+    logging.info(f"Agrégation terminée : {len(df_agg)} couples région/année météo disponibles.")
     return df_agg
 
 def clean_countries(df_country):
@@ -98,11 +159,40 @@ def clean_countries(df_country):
 
 def merge_data(df_wine, df_meteo):
     """
-    Fusionne les données Vin et Météo sur l'année (Left Join).
+    Fusionne les données Vin et Météo sur la région et l'année (Left Join).
+    Si les vins n'ont pas de colonne 'region', la jointure se fait sur l'année seule
+    (la météo ne doit alors couvrir qu'une région).
+
+    La météo est indexée et triée une fois, puis chaque vin est positionné dans cet
+    index (get_indexer), sans produit cartésien ni réordonnancement des vins.
     """
     logging.info("Fusion des données Vin et Météo...")
     
-    merged_df = pd.merge(df_wine, df_meteo, on='year', how='left')
+    keys = ['region', 'year'] if 'region' in df_wine.columns else ['year']
+    meteo_columns = [col for col in df_meteo.columns if col not in ('region', 'year')]
+    
+    if keys == ['year'] and 'region' in df_meteo.columns and df_meteo['region'].nunique() > 1:
+        raise ValueError("Les vins n'ont pas de région mais la météo en couvre plusieurs : jointure ambiguë.")
+    
+    if 'region' in keys:
+        df_meteo = df_meteo.assign(region=df_meteo['region'].astype(str))
+    df_index = df_meteo.set_index(keys)[meteo_columns].sort_index()
+    if not df_index.index.is_unique:
+        raise ValueError(f"La météo contient des doublons pour les clés {keys}.")
+    
+    if len(keys) == 1:
+        wine_keys = pd.Index(df_wine['year'])
+    else:
+        wine_keys = pd.MultiIndex.from_arrays([df_wine['region'].astype(str), df_wine['year']])
+    positions = df_index.index.get_indexer(wine_keys)
+    
+    # -1 = millésime sans météo : valeurs manquantes, comme un left join
+    matched = positions >= 0
+    merged_df = df_wine.copy()
+    for col in meteo_columns:
+        values = np.full(len(df_wine), np.nan)
+        values[matched] = df_index[col].to_numpy()[positions[matched]]
+        merged_df[col] = values
     
     logging.info(f"Fusion terminée. Taille finale : {len(merged_df)} lignes.")
     return merged_df
@@ -6,11 +6,16 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
 from loguru import logger
+from typing import List, Optional
 import sys
 import pandas as pd
-import joblib
 import os
 
+from src.drift import DriftMonitor
+from src.model_registry import ModelRegistry
+from src.profiling import ProfilingMiddleware, RequestProfiler, stage
+from src.static_assets import CachedPage, CachedStaticFiles, build_static_assets, make_static_url
+
 # --- Configuration Logging (Loguru) ---
 logger.remove() # Enlever le handler par défaut
 logger.add(sys.stderr, level="INFO") # Réajouter pour la console
@@ -22,18 +27,46 @@ from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Charge le modèle au démarrage
-    global model
-    if os.path.exists(MODEL_PATH):
-        model = joblib.load(MODEL_PATH)
-        print(f"Modèle chargé depuis {MODEL_PATH}")
+    # Recense les modèles et précharge les plus utilisés (les autres seront chargés à la demande)
+    global registry
+    registry = ModelRegistry(MODELS_DIR, default_path=MODEL_PATH, max_bytes=MODEL_CACHE_MB * 1024 ** 2, usage_path=MODEL_USAGE_PATH)
+    preloaded = registry.preload(MODEL_PRELOAD)
+    if preloaded:
+        print(f"Modèles chargés : {', '.join(preloaded)}")
+    else:
+        print(f"ATTENTION: Aucun modèle trouvé dans {MODELS_DIR}. L'API ne pourra pas faire de prédictions.")
+
+    # [MONITORING] Suivi de dérive des entrées (baseline produit par train_model.py)
+    global drift_monitor
+    drift_monitor = DriftMonitor.load(DRIFT_BASELINE_PATH, directory=DRIFT_DIR)
+    if drift_monitor is not None:
+        drift_monitor.start()
     else:
-        print(f"ATTENTION: Modèle non trouvé à {MODEL_PATH}. L'API ne pourra pas faire de prédictions.")
+        print(f"ATTENTION: Baseline de dérive non trouvé à {DRIFT_BASELINE_PATH}. Le suivi de dérive est désactivé.")
+
+    # [PERF] Préparation des fichiers statiques et rendu unique de la page d'accueil
+    global index_page
+    if STATIC_CACHE:
+        manifest = build_static_assets(STATIC_DIR)
+        templates.env.globals["static_url"] = make_static_url(manifest)
+        static_files.manifest = manifest
+        index_page = CachedPage(templates.get_template("index.html").render())
+        logger.info(f"Cache statique activé : {len(manifest)} fichiers, page d'accueil en mémoire.")
     yield
-    # Code à l'arrêt si nécessaire (rien ici)
+    # À l'arrêt : dernière écriture des statistiques de dérive de ce worker
+    if drift_monitor is not None:
+        drift_monitor.stop()
+    # Compteurs d'utilisation des modèles, pour le préchargement au prochain démarrage
+    registry.save_usage()
 
 app = FastAPI(title="Elyos Wine Quality API", description="API de prédiction de la qualité du vin.", version="1.0", lifespan=lifespan)
 
+# [MONITORING] Profilage à la demande de /predict (échantillonnage, ou en-tête X-Elyos-Profile
+# portant le secret ELYOS_PROFILE_TOKEN). Les requêtes dépassant le seuil sont enregistrées
+# dans logs/profiles (buffer circulaire).
+profiler = RequestProfiler.from_env(paths=["/predict", "/predict/batch"])
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # [MONITORING] Capture des erreurs de validation (422) pour les logs
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -55,14 +88,47 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors()},
     )
 
+# [PERF] Mode cache : page d'accueil rendue une fois par déploiement, fichiers statiques
+# versionnés par hash et précompressés (gzip/brotli). Désactivé par défaut pour le dev (--reload).
+STATIC_CACHE = os.getenv("ELYOS_STATIC_CACHE", "0") == "1"
+STATIC_DIR = "static"
+index_page = None
+
 # Montage des fichiers statiques (CSS, JS, Images)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_files_class = CachedStaticFiles if STATIC_CACHE else StaticFiles
+static_files = static_files_class(directory=STATIC_DIR)
+app.mount("/static", static_files, name="static")
 
 # Configuration des templates (Jinja2)
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = make_static_url({})
 
+MODELS_DIR = "models"
 MODEL_PATH = "models/best_model.joblib"
-model = None
+# Registre multi-modèles : mémoire maximale des modèles chargés et nombre de modèles préchargés
+MODEL_CACHE_MB = int(os.getenv("ELYOS_MODEL_CACHE_MB", "512"))
+MODEL_PRELOAD = int(os.getenv("ELYOS_MODEL_PRELOAD", "3"))
+MODEL_USAGE_PATH = "logs/model_usage.json"
+registry = None
+
+DRIFT_BASELINE_PATH = "models/drift_baseline.json"
+DRIFT_DIR = os.getenv("ELYOS_DRIFT_DIR", "logs/drift")
+drift_monitor = None
+
+# Correspondance entre les champs de l'API et les colonnes utilisées lors de l'entraînement
+COLUMN_MAPPING = {
+    "fixed_acidity": "fixed acidity",
+    "volatile_acidity": "volatile acidity",
+    "citric_acid": "citric acid",
+    "residual_sugar": "residual sugar",
+    "free_sulfur_dioxide": "free sulfur dioxide",
+    "total_sulfur_dioxide": "total sulfur dioxide",
+    "temperature": "temperature_2m_mean",
+    "rain": "rain_sum"
+}
+
+# Champs servant à choisir le modèle, exclus des variables envoyées au modèle
+ROUTING_FIELDS = {"region", "grape", "vintage"}
 
 # --- Schémas de Données (Pydantic) ---
 
@@ -84,12 +150,34 @@ class WineFeatures(BaseModel):
     alcohol: float = Field(..., le=20.0, description="Taux d'alcool (max 20%)")
     temperature: float  # Sera renommé en temperature_2m_mean
     rain: float         # Sera renommé en rain_sum
+    # Sélection du modèle (facultatif) : sans correspondance, le modèle par défaut est utilisé
+    region: Optional[str] = None
+    grape: Optional[str] = None
+    vintage: Optional[int] = None
+
+def record_drift(row=None, predicted_score=None, df=None, predictions=None):
+    """
+    Met à jour les statistiques de dérive, pour une requête (row) ou un lot (df).
+    Une erreur de monitoring ne fait pas échouer la prédiction.
+    """
+    if drift_monitor is None:
+        return
+    try:
+        with stage("drift"):
+            if df is not None:
+                drift_monitor.update_batch(df, predictions)
+            else:
+                drift_monitor.update(row, predicted_score)
+    except Exception as e:
+        logger.error(f"Erreur lors de la mise à jour des statistiques de dérive : {str(e)}")
 
 # --- Endpoints ---
 
 @app.get("/")
 def read_root(request: Request):
     """Endpoint de base pour vérifier que l'API est en ligne."""
+    if index_page is not None:
+        return index_page.response(request)
     return templates.TemplateResponse(request=request, name="index.html")
 
 @app.post("/predict")
@@ -98,44 +186,100 @@ def predict_quality(features: WineFeatures):
     Reçoit les caractéristiques du vin et retourne la qualité prédite.
     """
     # [MONITORING] Log de la requête entrante
-    logger.info(f"Prédiction demandée pour un vin avec Alcool={features.alcohol}, Acidité={features.fixed_acidity}, Temp={features.temperature}")
+    with stage("log_request"):
+        logger.info(f"Prédiction demandée pour un vin avec Alcool={features.alcohol}, Acidité={features.fixed_acidity}, Temp={features.temperature}")
 
     # [INCIDENT] Le check manuel a été remplacé par une validation Pydantic.
     # Si alcohol > 20, FastAPI renvoie automatiquement une 422 (Bad Request).
     
-    if model is None:
+    # Choix du modèle selon la région / le cépage / le millésime
+    model_key = registry.resolve(features.region, features.grape, features.vintage) if registry is not None else None
+    if model_key is None:
         logger.error("Tentative de prédiction alors que le modèle n'est pas chargé.")
         raise HTTPException(status_code=503, detail="Le modèle n'est pas chargé.")
 
     # Conversion des données en DataFrame
-    data_dict = features.dict()
-    df = pd.DataFrame([data_dict])
-
-    # Renommage des colonnes pour correspondre à celles utilisées lors de l'entraînement
-    df = df.rename(columns={
-        "fixed_acidity": "fixed acidity",
-        "volatile_acidity": "volatile acidity",
-        "citric_acid": "citric acid",
-        "residual_sugar": "residual sugar",
-        "free_sulfur_dioxide": "free sulfur dioxide",
-        "total_sulfur_dioxide": "total sulfur dioxide",
-        "temperature": "temperature_2m_mean",
-        "rain": "rain_sum"
-    })
+    with stage("dataframe"):
+        data_dict = features.dict(exclude=ROUTING_FIELDS)
+        df = pd.DataFrame([data_dict])
+
+        # Renommage des colonnes pour correspondre à celles utilisées lors de l'entraînement
+        df = df.rename(columns=COLUMN_MAPPING)
 
     # Prédiction
     try:
-        prediction = model.predict(df)
+        with stage("predict"):
+            prediction = registry.get(model_key).predict(df)
         predicted_score = float(prediction[0])
         
         # [MONITORING] Log du succès
-        logger.success(f"Prédiction envoyée : {predicted_score:.2f}/10")
-        
-        return {"predicted_quality": predicted_score}
+        with stage("log_response"):
+            logger.success(f"Prédiction envoyée : {predicted_score:.2f}/10 (modèle {model_key})")
+
+    except Exception as e:
+        logger.error(f"Erreur interne du modèle : {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
+
+    # [MONITORING] Statistiques de dérive (en mémoire fixe, verrou par shard rarement disputé)
+    record_drift({COLUMN_MAPPING.get(name, name): value for name, value in data_dict.items()}, predicted_score)
+
+    return {"predicted_quality": predicted_score, "model": model_key}
+
+@app.post("/predict/batch")
+def predict_quality_batch(wines: List[WineFeatures]):
+    """
+    Reçoit une liste de vins et retourne les qualités prédites, dans le même ordre.
+    Les vins sont regroupés par modèle : chaque modèle prédit toutes ses lignes en un seul appel.
+    """
+    # [MONITORING] Log de la requête entrante
+    with stage("log_request"):
+        logger.info(f"Prédiction demandée pour un lot de {len(wines)} vins")
+
+    model_keys = [registry.resolve(wine.region, wine.grape, wine.vintage) for wine in wines] if registry is not None else [None]
+    if None in model_keys:
+        logger.error("Tentative de prédiction alors que le modèle n'est pas chargé.")
+        raise HTTPException(status_code=503, detail="Le modèle n'est pas chargé.")
+
+    # Conversion des données en DataFrame (colonnes renommées comme lors de l'entraînement)
+    with stage("dataframe"):
+        rows = [{COLUMN_MAPPING.get(name, name): value for name, value in wine.dict(exclude=ROUTING_FIELDS).items()} for wine in wines]
+        df = pd.DataFrame(rows)
+
+    # Prédiction
+    try:
+        with stage("predict"):
+            predictions = registry.predict(df, model_keys)
+
+        # [MONITORING] Log du succès
+        with stage("log_response"):
+            logger.success(f"{len(wines)} prédictions envoyées ({len(set(model_keys))} modèle(s))")
+
     except Exception as e:
         logger.error(f"Erreur interne du modèle : {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
+    # [MONITORING] Statistiques de dérive (un seul appel vectorisé pour tout le lot)
+    record_drift(df=df, predictions=predictions)
+
+    return {"predicted_quality": predictions.tolist(), "models": model_keys}
+
+@app.get("/models")
+def list_models():
+    """Modèles disponibles (par version), règles de sélection et modèles actuellement en mémoire."""
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Le registre de modèles n'est pas initialisé.")
+    return registry.info()
+
+@app.get("/drift")
+def drift_report():
+    """
+    Statistiques des requêtes reçues (tous workers confondus) et score de dérive
+    par rapport aux données d'entraînement (PSI : < 0.1 stable, > 0.25 dérive significative).
+    """
+    if drift_monitor is None:
+        raise HTTPException(status_code=503, detail="Le suivi de dérive n'est pas disponible (baseline manquant).")
+    return drift_monitor.report()
+
 # Comme demandé, ce commentaire justifie l'architecture REST :
 # L'architecture REST est choisie ici pour sa simplicité, sa standardisation (HTTP, JSON) 
 # et sa compatibilité universelle. FastAPI permet de créer rapidement des endpoints performants (asynchrones)
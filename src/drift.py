@@ -0,0 +1,284 @@
+import glob
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from loguru import logger
+
+# Seuils usuels du PSI (Population Stability Index)
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Évite log(0) quand un bin est vide d'un côté
+PSI_EPSILON = 1e-4
+
+# Un état non réécrit depuis ce nombre d'intervalles d'écriture vient d'un worker arrêté
+STALE_FLUSHES = 3
+
+# Nombre fixe de shards par worker (les threads, recyclés par anyio, se les partagent)
+N_SHARDS = 16
+
+class _Shard:
+    """
+    Statistiques d'un groupe de threads : moyenne/variance (Welford), min/max et histogrammes.
+    Le verrou n'est disputé que si plus de N_SHARDS threads mettent à jour en même temps ;
+    il garantit aussi que count et les moments sont lus ensemble.
+    """
+
+    def __init__(self, n_features, n_bins):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.hist = np.zeros((n_features, n_bins), dtype=np.int64)
+
+    def update(self, x, edges, rows):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+        # Index du bin = nombre de bornes strictement inférieures (même convention que l'entraînement)
+        bins = (x[:, None] > edges).sum(axis=1)
+        self.hist[rows, bins] += 1
+
+    def update_batch(self, X, edges, rows):
+        """Ajoute un lot de lignes (matrice m x variables) en quelques opérations numpy."""
+        m = len(X)
+        if m == 0:
+            return
+        batch_mean = X.mean(axis=0)
+        delta = batch_mean - self.mean
+        count = self.count + m
+        # Fusion du lot avec l'état courant (formule de Chan)
+        self.m2 += ((X - batch_mean) ** 2).sum(axis=0) + delta ** 2 * self.count * m / count
+        self.mean += delta * m / count
+        self.count = count
+        np.minimum(self.min, X.min(axis=0), out=self.min)
+        np.maximum(self.max, X.max(axis=0), out=self.max)
+        bins = (X[:, :, None] > edges[None, :, :]).sum(axis=2)
+        flat = (rows[None, :] * self.hist.shape[1] + bins).ravel()
+        self.hist += np.bincount(flat, minlength=self.hist.size).reshape(self.hist.shape)
+
+def _merge(a, b):
+    """Fusionne deux jeux de statistiques (formule de Chan pour la variance)."""
+    if a["count"] == 0:
+        return b
+    if b["count"] == 0:
+        return a
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta ** 2 * a["count"] * b["count"] / count,
+        "min": np.minimum(a["min"], b["min"]),
+        "max": np.maximum(a["max"], b["max"]),
+        "hist": a["hist"] + b["hist"],
+    }
+
+def _histogram_quantile(hist, edges, low, high, q):
+    """Estime un quantile à partir de l'histogramme (interpolation linéaire dans le bin)."""
+    total = hist.sum()
+    if total == 0:
+        return None
+    cumulative = np.cumsum(hist)
+    target = q * total
+    b = int(np.searchsorted(cumulative, target))
+    lower = edges[b - 1] if b > 0 else low
+    upper = edges[b] if b < len(edges) else high
+    lower, upper = max(lower, low), min(upper, high)
+    before = cumulative[b - 1] if b > 0 else 0
+    fraction = (target - before) / hist[b] if hist[b] else 0.0
+    return float(lower + fraction * (upper - lower))
+
+class DriftMonitor:
+    """
+    Statistiques en ligne des requêtes /predict, en mémoire fixe.
+    - Chaque thread est affecté à l'un des N_SHARDS shards préalloués (peu de contention entre requêtes).
+    - Chaque worker uvicorn écrit périodiquement son état dans `directory` ;
+      le rapport fusionne les fichiers des workers en vie (réécrits récemment)
+      calculés sur le même baseline.
+    - Le score de dérive compare les histogrammes au baseline d'entraînement (PSI).
+    """
+
+    def __init__(self, baseline, directory="logs/drift", flush_interval=10.0, n_shards=N_SHARDS):
+        self.features = baseline["features"]
+        self.edges = np.asarray(baseline["edges"], dtype=float)
+        self.baseline = baseline
+        # Identifie le baseline (donc le modèle) et ce démarrage du worker : un PID réutilisé
+        # après redémarrage n'écrase pas l'état d'un autre processus
+        self.baseline_hash = hashlib.sha256(json.dumps(baseline, sort_keys=True).encode()).hexdigest()[:16]
+        self.boot_id = uuid.uuid4().hex[:12]
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._rows = np.arange(len(self.features))
+        self._n_bins = self.edges.shape[1] + 1
+        self._shards = [_Shard(len(self.features), self._n_bins) for _ in range(n_shards)]
+        self._local = threading.local()
+        # Affectation tournante : un thread recréé reprend un shard existant
+        self._next_slot = itertools.count()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Charge le baseline sauvegardé par train_model.py (None s'il n'existe pas)."""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._shards[next(self._next_slot) % len(self._shards)]
+            self._local.shard = shard
+        return shard
+
+    def update(self, row, prediction):
+        """Ajoute une requête : `row` utilise les noms de colonnes de l'entraînement."""
+        x = np.array([row[name] for name in self.features[:-1]] + [prediction], dtype=float)
+        shard = self._shard()
+        with shard.lock:
+            shard.update(x, self.edges, self._rows)
+
+    def update_batch(self, df, predictions):
+        """Ajoute un lot de requêtes (DataFrame aux colonnes de l'entraînement) sans boucle Python."""
+        X = np.column_stack([df[self.features[:-1]].to_numpy(dtype=float), np.asarray(predictions, dtype=float)])
+        shard = self._shard()
+        with shard.lock:
+            shard.update_batch(X, self.edges, self._rows)
+
+    def _local_state(self):
+        state = {"count": 0}
+        for shard in self._shards:
+            # Copie sous verrou : jamais un count associé aux moments d'une autre mise à jour
+            with shard.lock:
+                snapshot = {
+                    "count": shard.count, "mean": shard.mean.copy(), "m2": shard.m2.copy(),
+                    "min": shard.min.copy(), "max": shard.max.copy(), "hist": shard.hist.copy(),
+                }
+            state = _merge(state, snapshot)
+        return state
+
+    def flush(self):
+        """Écrit l'état de ce worker (remplacement atomique du fichier)."""
+        state = self._local_state()
+        if state["count"] == 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"worker_{os.getpid()}_{self.boot_id}.json")
+        tmp_path = path + ".tmp"
+        data = {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in state.items()}
+        data["boot_id"] = self.boot_id
+        data["baseline_hash"] = self.baseline_hash
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def start(self):
+        """Démarre l'écriture périodique de l'état de ce worker."""
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f"Impossible d'écrire les statistiques de dérive : {str(e)}")
+
+        self._flusher = threading.Thread(target=run, name="elyos-drift-flush", daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def merged_state(self):
+        """
+        Fusionne les états des workers en vie (dont celui-ci, à jour).
+        Les fichiers périmés (worker arrêté, déploiement précédent) sont supprimés ;
+        ceux d'un autre baseline ou d'un autre format d'histogramme sont ignorés.
+        """
+        self.flush()
+        state = {"count": 0}
+        stale_before = time.time() - STALE_FLUSHES * self.flush_interval
+        expected_shape = (len(self.features), self._n_bins)
+
+        for path in glob.glob(os.path.join(self.directory, "worker_*.json")):
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # Fichier en cours de remplacement, déjà supprimé ou corrompu
+            if data.get("baseline_hash") != self.baseline_hash:
+                continue  # État calculé sur un autre baseline (avant ré-entraînement)
+            worker_state = {key: np.asarray(data[key]) for key in ("mean", "m2", "min", "max", "hist")}
+            if worker_state["hist"].shape != expected_shape:
+                continue
+            worker_state["count"] = data["count"]
+            state = _merge(state, worker_state)
+        return state
+
+    def report(self):
+        """Statistiques par variable et score de dérive (PSI) par rapport au baseline."""
+        state = self.merged_state()
+        count = state["count"]
+        features = {}
+
+        for i, name in enumerate(self.features):
+            base_mean = self.baseline["mean"][i]
+            base_std = self.baseline["std"][i]
+            expected = np.asarray(self.baseline["proportions"][i]) + PSI_EPSILON
+
+            if count == 0:
+                features[name] = {"count": 0, "baseline_mean": base_mean}
+                continue
+
+            mean = float(state["mean"][i])
+            std = math.sqrt(state["m2"][i] / count)
+            actual = state["hist"][i] / count + PSI_EPSILON
+            psi = float(np.sum((actual - expected) * np.log(actual / expected)))
+            low, high = float(state["min"][i]), float(state["max"][i])
+
+            features[name] = {
+                "count": int(count),
+                "mean": mean,
+                "std": std,
+                "min": low,
+                "max": high,
+                "quantiles": {
+                    f"p{int(q * 100):02d}": _histogram_quantile(state["hist"][i], self.edges[i], low, high, q)
+                    for q in (0.05, 0.5, 0.95)
+                },
+                "baseline_mean": base_mean,
+                "mean_shift_z": (mean - base_mean) / base_std if base_std else None,
+                "psi": psi,
+            }
+
+        input_psi = [features[name]["psi"] for name in self.features[:-1] if "psi" in features[name]]
+        drift_score = max(input_psi) if input_psi else None
+
+        if drift_score is None:
+            status = "no_data"
+        elif drift_score >= PSI_SIGNIFICANT:
+            status = "significant"
+        elif drift_score >= PSI_MODERATE:
+            status = "moderate"
+        else:
+            status = "stable"
+
+        return {"count": int(count), "drift_score": drift_score, "status": status, "features": features}
@@ -0,0 +1,228 @@
+import json
+import os
+import pickle
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# Verrou de fichier pour cumuler les compteurs entre workers (absent sous Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Nom du modèle historique (models/best_model.joblib), utilisé quand aucune règle ne s'applique
+DEFAULT_MODEL = "default"
+
+def _natural_key(version):
+    """Tri 'naturel' des versions : v2 < v10, 2024-01 < 2024-12."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+class _ByteCounter:
+    """Flux d'écriture qui ne fait que compter les octets reçus."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += memoryview(data).nbytes
+
+def _model_nbytes(model):
+    """
+    Taille en mémoire d'un modèle, mesurée par sa sérialisation pickle non compressée
+    (dominée par les tableaux numpy, comme l'occupation réelle). Rien n'est conservé en mémoire.
+    """
+    counter = _ByteCounter()
+    pickle.dump(model, counter, protocol=pickle.HIGHEST_PROTOCOL)
+    return counter.size
+
+class ModelRegistry:
+    """
+    Registre de modèles versionnés : models/<nom>/<version>.joblib.
+    - Les modèles sont chargés à la première utilisation, puis gardés dans un cache LRU
+      borné en mémoire (taille mesurée au chargement, pas celle du fichier joblib souvent compressé).
+    - models/registry.json associe région / cépage / millésime à un modèle (première règle qui correspond).
+    - Les compteurs d'utilisation sont conservés pour précharger les modèles les plus demandés au démarrage.
+    """
+
+    def __init__(self, directory="models", default_path=None, max_bytes=512 * 1024 ** 2, usage_path=None):
+        self.directory = directory
+        self.default_path = default_path
+        self.max_bytes = max_bytes
+        self.usage_path = usage_path
+        self.artifacts = {}
+        self.routes = []
+        self.usage = Counter()
+        # Utilisations depuis le dernier save_usage : seules elles sont ajoutées au fichier
+        self._usage_delta = Counter()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.refresh()
+
+    def refresh(self):
+        """Recense les artefacts et les règles de sélection présents dans `directory`."""
+        artifacts = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                model_dir = os.path.join(self.directory, name)
+                if not os.path.isdir(model_dir):
+                    continue
+                versions = {f[:-len(".joblib")]: os.path.join(model_dir, f) for f in os.listdir(model_dir) if f.endswith(".joblib")}
+                if versions:
+                    artifacts[name] = versions
+
+        if DEFAULT_MODEL not in artifacts and self.default_path and os.path.exists(self.default_path):
+            artifacts[DEFAULT_MODEL] = {"0": self.default_path}
+        self.artifacts = artifacts
+
+        routes = []
+        config_path = os.path.join(self.directory, "registry.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+            for route in config.get("routes", []):
+                key = self._artifact_key(route["model"])
+                if key is None:
+                    logger.warning(f"Règle ignorée : modèle '{route['model']}' introuvable dans {self.directory}")
+                    continue
+                routes.append({**route, "key": key})
+        self.routes = routes
+
+        self.usage = self._read_usage() + self._usage_delta
+
+    def _read_usage(self):
+        if not self.usage_path or not os.path.exists(self.usage_path):
+            return Counter()
+        try:
+            with open(self.usage_path) as f:
+                return Counter(json.load(f))
+        except ValueError:
+            logger.warning(f"Compteurs d'utilisation illisibles ({self.usage_path}) : ignorés")
+            return Counter()
+
+    def _artifact_key(self, model):
+        """'nom' -> 'nom@<dernière version>', 'nom@version' -> inchangé s'il existe."""
+        name, _, version = model.partition("@")
+        versions = self.artifacts.get(name)
+        if not versions:
+            return None
+        if not version:
+            version = max(versions, key=_natural_key)
+        return f"{name}@{version}" if version in versions else None
+
+    def resolve(self, region=None, grape=None, vintage=None):
+        """Clé du modèle à utiliser pour une requête (None si aucun modèle ne convient)."""
+        for route in self.routes:
+            if "region" in route and route["region"] != region:
+                continue
+            if "grape" in route and route["grape"] != grape:
+                continue
+            if "vintage_min" in route and (vintage is None or vintage < route["vintage_min"]):
+                continue
+            if "vintage_max" in route and (vintage is None or vintage > route["vintage_max"]):
+                continue
+            return route["key"]
+        return self._artifact_key(DEFAULT_MODEL)
+
+    def get(self, key, rows=1):
+        """Renvoie le modèle `nom@version`, en le chargeant si nécessaire."""
+        with self._lock:
+            self.usage[key] += rows
+            self._usage_delta[key] += rows
+        return self._get(key)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Un seul chargement par modèle, même si plusieurs requêtes le demandent en même temps
+        with load_lock:
+            with self._lock:
+                entry = self._cache.get(key)
+            if entry is not None:
+                return entry[0]
+            return self._load(key)
+
+    def _load(self, key):
+        name, _, version = key.partition("@")
+        path = self.artifacts[name][version]
+        model = joblib.load(path)
+        size = _model_nbytes(model)
+        logger.info(f"Modèle {key} chargé depuis {path} ({size / 1024 ** 2:.1f} Mo)")
+
+        with self._lock:
+            self._cache[key] = (model, size)
+            self._cache_bytes += size
+            # Éviction des modèles les moins récemment utilisés (on garde toujours celui qu'on vient de charger)
+            while self._cache_bytes > self.max_bytes and len(self._cache) > 1:
+                evicted_key, (_, evicted_size) = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted_size
+                logger.info(f"Modèle {evicted_key} retiré du cache (limite mémoire)")
+        return model
+
+    def preload(self, count):
+        """Charge au démarrage les `count` modèles les plus utilisés (et le modèle par défaut)."""
+        keys = [key for key, _ in self.usage.most_common() if self._artifact_key(key) == key]
+        default_key = self._artifact_key(DEFAULT_MODEL)
+        if default_key is not None and default_key not in keys:
+            keys.insert(0, default_key)
+
+        loaded = []
+        for key in keys[:count]:
+            self._get(key)
+            loaded.append(key)
+        return loaded
+
+    def predict(self, df, keys):
+        """
+        Prédit un lot de lignes pouvant relever de modèles différents.
+        Les lignes sont regroupées par modèle : un seul appel à predict() par modèle.
+        """
+        predictions = np.empty(len(df))
+        for key, positions in pd.Series(keys).groupby(keys).indices.items():
+            predictions[positions] = self.get(key, rows=len(positions)).predict(df.iloc[positions])
+        return predictions
+
+    def save_usage(self):
+        """
+        Ajoute les utilisations de ce processus aux compteurs sur disque (utilisés par preload
+        au prochain démarrage). Les workers s'arrêtant ensemble, la lecture, l'addition et
+        l'écriture se font sous un verrou de fichier (flock) : aucun compteur n'est perdu.
+        """
+        if not self.usage_path:
+            return
+        with self._lock:
+            delta, self._usage_delta = self._usage_delta, Counter()
+        os.makedirs(os.path.dirname(self.usage_path) or ".", exist_ok=True)
+        with open(self.usage_path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # Libéré à la fermeture du fichier
+            usage = self._read_usage() + delta
+            tmp_path = f"{self.usage_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(dict(usage), f)
+            os.replace(tmp_path, self.usage_path)
+        self.usage = usage
+
+    def info(self):
+        with self._lock:
+            loaded = list(self._cache)
+            cache_bytes = self._cache_bytes
+        return {
+            "models": {name: sorted(versions, key=_natural_key) for name, versions in self.artifacts.items()},
+            "routes": self.routes,
+            "loaded": loaded,
+            "cache_mb": cache_bytes / 1024 ** 2,
+            "max_cache_mb": self.max_bytes / 1024 ** 2,
+        }
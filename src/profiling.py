@@ -0,0 +1,209 @@
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+import anyio
+from loguru import logger
+
+# Session de profilage de la requête en cours (None = requête non échantillonnée)
+current_session = ContextVar("elyos_profile_session", default=None)
+
+_NULL_STAGE = nullcontext()
+
+def stage(name):
+    """
+    Chronomètre une étape du traitement (`with stage("predict"): ...`).
+    Hors profilage, renvoie un contexte vide partagé : le coût se limite à une lecture de ContextVar.
+    """
+    session = current_session.get()
+    if session is None:
+        return _NULL_STAGE
+    return session.stage(name)
+
+class _StageTimer:
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.session.stages[self.name] = (time.perf_counter() - self.start) * 1000
+
+class ProfileSession:
+    """
+    Mesures d'une requête échantillonnée :
+    - durées des étapes (ms), dont 'validation' = parsing + Pydantic jusqu'à l'entrée dans l'endpoint ;
+    - profil statistique : piles d'appels du thread de l'endpoint, échantillonnées à intervalle fixe.
+    """
+
+    def __init__(self, sample_interval):
+        self.sample_interval = sample_interval
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.total_ms = None
+        self.stages = {}
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def stage(self, name):
+        # Le premier appel vient du thread de l'endpoint : c'est lui qu'on échantillonne
+        if self._thread_id is None:
+            self._thread_id = threading.get_ident()
+            self.stages["validation"] = (time.perf_counter() - self.start) * 1000
+            self._sampler = threading.Thread(target=self._sample, name="elyos-profiler", daemon=True)
+            self._sampler.start()
+        return _StageTimer(self, name)
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                # Format "folded" (racine;...;feuille), directement exploitable par flamegraph.pl / speedscope
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop_sampling(self):
+        # Non bloquant : peut être appelé depuis la boucle d'événements
+        self._stop.set()
+
+    def join(self):
+        # Bloquant (jusqu'à un intervalle d'échantillonnage) : à appeler hors de la boucle d'événements
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+        self.stop_sampling()
+
+    def server_timing(self):
+        """Valeur de l'en-tête HTTP Server-Timing (visible dans les outils du navigateur)."""
+        return ", ".join(f"{name};dur={duration:.2f}" for name, duration in self.stages.items())
+
+    def to_dict(self, path):
+        return {
+            "timestamp": self.started_at,
+            "path": path,
+            "total_ms": self.total_ms,
+            "stages_ms": self.stages,
+            "sample_interval_ms": self.sample_interval * 1000,
+            "samples": dict(self.samples.most_common()),
+        }
+
+class RequestProfiler:
+    """
+    Configuration du profilage à la demande.
+    Une requête est profilée si elle est tirée au sort (sample_rate) ou si l'en-tête `header`
+    contient le secret `token` (sans secret configuré, l'en-tête est ignoré).
+    Les requêtes plus lentes que threshold_ms sont écrites dans `directory`, qui conserve au plus max_files fichiers.
+    """
+
+    def __init__(self, paths, sample_rate=0.0, header="x-elyos-profile", token=None, threshold_ms=200.0,
+                 directory="logs/profiles", max_files=50, sample_interval_ms=1.0):
+        self.paths = set(paths)
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.token = token.encode("latin-1") if token else None
+        self.threshold_ms = threshold_ms
+        self.directory = directory
+        self.max_files = max_files
+        self.sample_interval = sample_interval_ms / 1000
+
+    @classmethod
+    def from_env(cls, paths):
+        """Construit le profiler à partir des variables d'environnement ELYOS_PROFILE_*."""
+        return cls(
+            paths,
+            sample_rate=float(os.getenv("ELYOS_PROFILE_SAMPLE_RATE", "0")),
+            header=os.getenv("ELYOS_PROFILE_HEADER", "x-elyos-profile"),
+            token=os.getenv("ELYOS_PROFILE_TOKEN"),
+            threshold_ms=float(os.getenv("ELYOS_PROFILE_THRESHOLD_MS", "200")),
+            directory=os.getenv("ELYOS_PROFILE_DIR", "logs/profiles"),
+            max_files=int(os.getenv("ELYOS_PROFILE_MAX_FILES", "50")),
+            sample_interval_ms=float(os.getenv("ELYOS_PROFILE_INTERVAL_MS", "1")),
+        )
+
+    def should_profile(self, scope):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return False
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        if self.token is None:
+            return False
+        return any(name == self.header and hmac.compare_digest(value, self.token) for name, value in scope["headers"])
+
+    def dump(self, session, path):
+        """
+        Écrit le profil dans le buffer circulaire sur disque.
+        Les fichiers sont horodatés (pas de collision entre workers) et les plus anciens sont supprimés.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"profile_{session.started_at:.6f}_{os.getpid()}.json"
+        with open(os.path.join(self.directory, filename), "w") as f:
+            json.dump(session.to_dict(path), f, indent=2)
+
+        files = sorted(name for name in os.listdir(self.directory) if name.startswith("profile_"))
+        for name in files[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # Déjà supprimé par un autre worker
+
+        logger.warning(f"Requête lente ({session.total_ms:.1f} ms) sur {path} : profil enregistré dans {filename}")
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI pur (sans BaseHTTPMiddleware) : une requête non profilée
+    est transmise telle quelle à l'application, sans tâche ni copie supplémentaire.
+    """
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(self.profiler.sample_interval)
+        token = current_session.set(session)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and session.stages:
+                # L'endpoint a terminé : le thread n'est plus à échantillonner (join plus tard, hors boucle)
+                session.stop_sampling()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", session.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_session.reset(token)
+            session.finish()
+            try:
+                await anyio.to_thread.run_sync(self._complete, session, scope["path"])
+            except OSError as e:
+                logger.error(f"Impossible d'enregistrer le profil : {str(e)}")
+
+    def _complete(self, session, path):
+        # Exécuté dans un thread : attente de l'échantillonneur puis écriture si la requête est lente
+        session.join()
+        if session.total_ms >= self.profiler.threshold_ms:
+            self.profiler.dump(session, path)
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+from urllib.parse import parse_qs
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+# Brotli est optionnel : sans lui, seules les variantes gzip sont générées.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions textuelles qui gagnent à être précompressées
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".html", ".svg", ".json", ".txt")
+
+# Cache navigateur d'un an pour les URLs versionnées (le hash change avec le contenu)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Sans version dans l'URL, le navigateur doit revalider (ETag / 304)
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+def _is_stale(source_path, target_path):
+    """Indique si la variante compressée est absente ou plus ancienne que la source."""
+    return not os.path.exists(target_path) or os.path.getmtime(target_path) < os.path.getmtime(source_path)
+
+def accepted_encodings(accept_encoding):
+    """
+    Encodages acceptés d'après l'en-tête Accept-Encoding (RFC 9110) : {encodage: q}.
+    Un encodage avec q=0 est explicitement refusé.
+    """
+    qvalues = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+def accepts_encoding(qvalues, encoding):
+    """Indique si le client accepte `encoding` (directement ou via '*')."""
+    return qvalues.get(encoding, qvalues.get("*", 0.0)) > 0
+
+def build_static_assets(directory):
+    """
+    Prépare les fichiers statiques pour la production.
+    - Calcule un hash de contenu pour chaque fichier (utilisé pour versionner les URLs).
+    - Génère les variantes .gz (et .br si brotli est installé) des fichiers texte.
+    Retourne le manifeste {chemin relatif: hash}.
+    """
+    manifest = {}
+
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith((".gz", ".br")):
+                continue
+
+            source_path = os.path.join(root, name)
+            relative_path = os.path.relpath(source_path, directory).replace(os.sep, "/")
+
+            with open(source_path, "rb") as f:
+                content = f.read()
+            manifest[relative_path] = hashlib.sha256(content).hexdigest()[:12]
+
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            # mtime=0 pour un résultat déterministe d'un build à l'autre
+            if _is_stale(source_path, source_path + ".gz"):
+                with open(source_path + ".gz", "wb") as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+            if brotli is not None and _is_stale(source_path, source_path + ".br"):
+                with open(source_path + ".br", "wb") as f:
+                    f.write(brotli.compress(content, quality=11))
+
+    return manifest
+
+def make_static_url(manifest, prefix="/static"):
+    """
+    Construit la fonction `static_url` exposée aux templates.
+    L'URL contient le hash du fichier (?v=...) pour autoriser un cache longue durée.
+    """
+    def static_url(path):
+        version = manifest.get(path)
+        if version is None:
+            return f"{prefix}/{path}"
+        return f"{prefix}/{path}?v={version}"
+
+    return static_url
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles avec en-têtes de cache et service des variantes précompressées.
+    Les variantes .br / .gz générées par `build_static_assets` sont servies
+    directement si le client les accepte : aucune compression à la volée.
+    Une variante plus ancienne que son fichier source est ignorée (source servie telle quelle).
+    `manifest` (renseigné au démarrage) sert à reconnaître les URLs versionnées.
+    """
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, *args, manifest=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest or {}
+
+    def _is_versioned(self, path, scope):
+        """L'URL porte-t-elle le hash actuel du fichier (?v=<hash>) ?"""
+        version = self.manifest.get(path.replace(os.sep, "/"))
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return version is not None and query.get("v") == [version]
+
+    async def get_response(self, path, scope):
+        response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304):
+            versioned = self._is_versioned(path, scope)
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    async def _precompressed_response(self, path, scope):
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            return None
+
+        qvalues = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        source_stat = None
+        for encoding, suffix in self.ENCODINGS:
+            if not accepts_encoding(qvalues, encoding):
+                continue
+
+            if source_stat is None:
+                _, source_stat = await anyio.to_thread.run_sync(self.lookup_path, path)
+                if source_stat is None:
+                    return None
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            # Variante plus ancienne que la source (fichier modifié depuis le build) : on ne la sert pas
+            if stat_result.st_mtime < source_stat.st_mtime:
+                continue
+
+            response = self.file_response(full_path, stat_result, scope)
+            response.headers["Content-Encoding"] = encoding
+            # Le type MIME est celui du fichier d'origine, pas de l'archive
+            media_type, _ = mimetypes.guess_type(path)
+            if media_type is not None:
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                response.headers["Content-Type"] = media_type
+            return response
+
+        return None
+
+class CachedPage:
+    """
+    Page HTML rendue une seule fois (au démarrage) et servie depuis la mémoire.
+    Gère l'ETag (réponse 304) et une variante gzip précalculée,
+    qui a son propre ETag puisque c'est une représentation différente.
+    """
+
+    def __init__(self, html):
+        self.body = html.encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+
+    def response(self, request):
+        use_gzip = accepts_encoding(accepted_encodings(request.headers.get("accept-encoding", "")), "gzip")
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzip_body, media_type="text/html", headers=headers)
+
+        return Response(content=self.body, media_type="text/html", headers=headers)
+
+if __name__ == "__main__":
+    # Permet de précompresser les fichiers au build de l'image Docker
+    manifest = build_static_assets("static")
+    print(f"{len(manifest)} fichiers statiques préparés (brotli {'activé' if brotli else 'indisponible'}).")
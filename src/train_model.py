@@ -4,11 +4,118 @@ from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
+import numpy as np
+import argparse
+import hashlib
 import joblib
+import json
+import math
 import os
 
-def train():
-    # 1. Chargement des données
+FEATURES = [
+    'fixed acidity', 'volatile acidity', 'citric acid', 'residual sugar',
+    'chlorides', 'free sulfur dioxide', 'total sulfur dioxide', 'density',
+    'pH', 'sulphates', 'alcohol', 'temperature_2m_mean', 'rain_sum'
+]
+TARGET = 'quality'
+
+MODELS_DIR = 'models'
+MODEL_PATH = os.path.join(MODELS_DIR, 'best_model.joblib')
+# État de l'entraînement (watermark, statistiques suffisantes) pour le mode incrémental
+STATE_PATH = os.path.join(MODELS_DIR, 'training_state.json')
+DRIFT_BASELINE_PATH = os.path.join(MODELS_DIR, 'drift_baseline.json')
+
+# Nombre de premières lignes hachées pour détecter une table recréée (ex: pipeline relancé)
+FINGERPRINT_ROWS = 100
+
+# Mode incrémental : les lignes dont l'id est multiple de HOLDOUT_MODULO servent
+# uniquement à la validation (jamais à l'entraînement), soit 20% des nouvelles données.
+HOLDOUT_MODULO = 5
+# Taille minimale du jeu de validation pour décider : en dessous, la mise à jour est reportée
+MIN_HOLDOUT_ROWS = 30
+# Dégradation tolérée de la MSE sur le jeu de validation avant de refuser le nouveau modèle
+VALIDATION_TOLERANCE = 0.05
+# Taille maximale de la forêt : au-delà, les arbres les plus anciens sont retirés
+MAX_TREES = 500
+
+# Nombre de bins des histogrammes de dérive (bornes = quantiles du jeu d'entraînement)
+DRIFT_BINS = 20
+
+def _bin_counts(edges, values):
+    # Même convention que l'API : index du bin = nombre de bornes strictement inférieures
+    bins = np.searchsorted(edges, values, side='left')
+    return np.bincount(bins, minlength=len(edges) + 1)
+
+def save_drift_baseline(X_train, y_pred_train, path):
+    """
+    Sauvegarde la distribution d'entraînement de chaque variable (et des prédictions)
+    pour le suivi de dérive de l'API (src/drift.py).
+    - edges : bornes intérieures des bins (quantiles).
+    - proportions : part des données d'entraînement dans chaque bin.
+    """
+    columns = {name: X_train[name].to_numpy(dtype=float) for name in X_train.columns}
+    columns['prediction'] = np.asarray(y_pred_train, dtype=float)
+
+    baseline = {'features': list(columns), 'edges': [], 'proportions': [], 'mean': [], 'std': [], 'count': len(X_train)}
+    quantiles = np.linspace(0, 1, DRIFT_BINS + 1)[1:-1]
+
+    for values in columns.values():
+        edges = np.quantile(values, quantiles)
+        proportions = _bin_counts(edges, values) / len(values)
+
+        baseline['edges'].append(edges.tolist())
+        baseline['proportions'].append(proportions.tolist())
+        baseline['mean'].append(float(values.mean()))
+        baseline['std'].append(float(values.std()))
+
+    with open(path, 'w') as f:
+        json.dump(baseline, f)
+
+def update_drift_baseline(X_new, y_pred_new, path):
+    """
+    Ajoute de nouvelles lignes d'entraînement au baseline de dérive, sans relire l'historique.
+    Les bornes des bins sont conservées : proportions, moyennes et écarts-types sont
+    pondérés par le nombre de lignes. Les prédictions du nouveau modèle sur l'historique
+    ne sont pas recalculées : seule la distribution des nouvelles prédictions est ajoutée.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        baseline = json.load(f)
+
+    columns = [X_new[name].to_numpy(dtype=float) for name in baseline['features'][:-1]]
+    columns.append(np.asarray(y_pred_new, dtype=float))
+    n_old, n_new = baseline['count'], len(X_new)
+    total = n_old + n_new
+
+    for i, values in enumerate(columns):
+        counts = _bin_counts(np.asarray(baseline['edges'][i]), values)
+        proportions = (np.asarray(baseline['proportions'][i]) * n_old + counts) / total
+        # Fusion des moyennes / variances (formule de Chan)
+        mean_old, var_old = baseline['mean'][i], baseline['std'][i] ** 2
+        delta = values.mean() - mean_old
+        m2 = var_old * n_old + values.var() * n_new + delta ** 2 * n_old * n_new / total
+
+        baseline['proportions'][i] = proportions.tolist()
+        baseline['mean'][i] = float(mean_old + delta * n_new / total)
+        baseline['std'][i] = float(math.sqrt(m2 / total))
+    baseline['count'] = total
+
+    with open(path, 'w') as f:
+        json.dump(baseline, f)
+
+def _table_fingerprint(conn, watermark):
+    """
+    Empreinte de la table jusqu'au watermark : nombre de lignes et hash des premières lignes
+    et de la dernière. process_and_load.py recrée la table (DROP TABLE) à chaque exécution :
+    les id repartent de 1, et seule cette empreinte permet de s'en apercevoir.
+    """
+    row_count = conn.execute("SELECT COUNT(*) FROM vins_enrichis WHERE id <= ?", (watermark,)).fetchone()[0]
+    rows = conn.execute("SELECT * FROM vins_enrichis WHERE id <= ? ORDER BY id LIMIT ?", (watermark, FINGERPRINT_ROWS)).fetchall()
+    rows += conn.execute("SELECT * FROM vins_enrichis WHERE id = ?", (watermark,)).fetchall()
+    return {'row_count': row_count, 'fingerprint': hashlib.sha256(repr(rows).encode()).hexdigest()}
+
+def _resolve_db_path():
     db_path = 'data_pipeline/data/viti_quality.db'
     if not os.path.exists(db_path):
         print(f"Erreur: La base de données n'existe pas à l'emplacement: {db_path}")
@@ -17,20 +124,38 @@ def train():
              db_path = 'data/viti_quality.db'
              print(f"Base de données trouvée à: {db_path}")
         else:
-             return
+             return None
+    return db_path
+
+def _linear_stats(X, y):
+    """
+    Statistiques suffisantes des moindres carrés (avec colonne d'intercept) : X'X et X'y.
+    Elles s'additionnent d'un lot à l'autre, ce qui permet de mettre à jour
+    la régression linéaire sans relire l'historique.
+    """
+    Xb = np.column_stack([np.ones(len(X)), X.to_numpy(dtype=float)])
+    return Xb.T @ Xb, Xb.T @ y.to_numpy(dtype=float)
+
+def save_training_state(state):
+    with open(STATE_PATH, 'w') as f:
+        json.dump(state, f)
+
+def train():
+    # 1. Chargement des données
+    db_path = _resolve_db_path()
+    if db_path is None:
+        return
 
     print(f"Chargement des données depuis {db_path}...")
     conn = sqlite3.connect(db_path)
     df = pd.read_sql_query("SELECT * FROM vins_enrichis", conn)
+    watermark = int(df['id'].max())
+    table_state = _table_fingerprint(conn, watermark)
     conn.close()
 
     # 2. Préparation (Features/Target)
-    features = [
-        'fixed acidity', 'volatile acidity', 'citric acid', 'residual sugar',
-        'chlorides', 'free sulfur dioxide', 'total sulfur dioxide', 'density',
-        'pH', 'sulphates', 'alcohol', 'temperature_2m_mean', 'rain_sum'
-    ]
-    target = 'quality'
+    features = FEATURES
+    target = TARGET
 
     # Vérification des colonnes
     missing_cols = [col for col in features if col not in df.columns]
@@ -86,11 +211,134 @@ def train():
     print(f"\nLe meilleur modèle est : {best_name} (R2={best_r2:.4f})")
 
     # Sauvegarde
-    models_dir = 'models'
+    models_dir = MODELS_DIR
     os.makedirs(models_dir, exist_ok=True)
-    model_path = os.path.join(models_dir, 'best_model.joblib')
+    model_path = MODEL_PATH
     joblib.dump(best_model, model_path)
     print(f"Modèle sauvegardé dans : {model_path}")
 
+    # État pour les entraînements incrémentaux suivants
+    xtx, xty = _linear_stats(X_train, y_train)
+    save_training_state({
+        'watermark': watermark,
+        **table_state,
+        'model': 'random_forest' if best_model is rf else 'linear_regression',
+        'n_seen': len(X_train),
+        'base_estimators': rf.n_estimators,
+        'xtx': xtx.tolist(),
+        'xty': xty.tolist(),
+    })
+
+    # Baseline de dérive (distribution des données d'entraînement)
+    baseline_path = DRIFT_BASELINE_PATH
+    save_drift_baseline(X_train, best_model.predict(X_train), baseline_path)
+    print(f"Baseline de dérive sauvegardé dans : {baseline_path}")
+
+def train_incremental():
+    """
+    Met à jour le modèle existant avec les seules lignes ajoutées depuis le dernier entraînement.
+    - Random Forest : ajout d'arbres entraînés sur les nouvelles données (warm_start).
+    - Régression linéaire : mise à jour exacte via les statistiques suffisantes X'X / X'y.
+    Le nouveau modèle n'est sauvegardé que si sa MSE sur les nouvelles lignes de validation
+    ne dépasse pas celle du modèle actuel de plus de VALIDATION_TOLERANCE. Ces lignes de
+    validation ne servent jamais à l'entraînement, même aux tours suivants.
+    Si la table a été recréée depuis le dernier entraînement, un entraînement complet est relancé.
+    """
+    if not os.path.exists(STATE_PATH) or not os.path.exists(MODEL_PATH):
+        print("Aucun entraînement précédent trouvé : lancement d'un entraînement complet.")
+        train()
+        return
+
+    with open(STATE_PATH) as f:
+        state = json.load(f)
+    model = joblib.load(MODEL_PATH)
+
+    # 1. Chargement des nouvelles lignes uniquement (id > watermark, via la clé primaire)
+    db_path = _resolve_db_path()
+    if db_path is None:
+        return
+
+    conn = sqlite3.connect(db_path)
+    table_state = _table_fingerprint(conn, state['watermark'])
+    if table_state != {'row_count': state.get('row_count'), 'fingerprint': state.get('fingerprint')}:
+        conn.close()
+        print("La table a été recréée depuis le dernier entraînement : lancement d'un entraînement complet.")
+        train()
+        return
+
+    print(f"Chargement des lignes ajoutées depuis l'id {state['watermark']}...")
+    df = pd.read_sql_query("SELECT * FROM vins_enrichis WHERE id > ? ORDER BY id", conn, params=(state['watermark'],))
+    conn.close()
+
+    if df.empty:
+        print("Aucune nouvelle donnée : le modèle est à jour.")
+        return
+
+    # 2. Séparation déterministe Train / Validation sur l'id
+    holdout = df['id'] % HOLDOUT_MODULO == 0
+    if holdout.sum() < MIN_HOLDOUT_ROWS or holdout.all():
+        print(f"Seulement {len(df)} nouvelle(s) ligne(s), pas assez pour entraîner et valider "
+              f"(minimum {MIN_HOLDOUT_ROWS} en validation) : mise à jour reportée.")
+        return
+
+    X_train, y_train = df.loc[~holdout, FEATURES], df.loc[~holdout, TARGET]
+    X_val, y_val = df.loc[holdout, FEATURES], df.loc[holdout, TARGET]
+    print(f"{len(df)} nouvelles lignes (Train {len(X_train)} / Validation {len(X_val)}).")
+
+    # 3. Mise à jour du modèle (le score du modèle actuel est mesuré avant modification)
+    mse_current = mean_squared_error(y_val, model.predict(X_val))
+    n_seen = state['n_seen'] + len(X_train)
+    candidate = model
+
+    if state['model'] == 'random_forest':
+        # Nombre d'arbres ajoutés proportionnel à la part des nouvelles données
+        n_new_trees = max(1, math.ceil(state['base_estimators'] * len(X_train) / n_seen))
+        # Graine propre à ce tour : une fois la forêt tronquée à MAX_TREES, la graine fixe
+        # redonnerait aux nouveaux arbres les graines d'arbres encore présents
+        candidate.set_params(warm_start=True, n_estimators=candidate.n_estimators + n_new_trees,
+                             random_state=state['watermark'])
+        candidate.fit(X_train, y_train)
+        if len(candidate.estimators_) > MAX_TREES:
+            candidate.estimators_ = candidate.estimators_[-MAX_TREES:]
+            candidate.n_estimators = MAX_TREES
+        print(f"Random Forest : {n_new_trees} arbres ajoutés ({candidate.n_estimators} au total).")
+    else:
+        xtx, xty = _linear_stats(X_train, y_train)
+        xtx = np.asarray(state['xtx']) + xtx
+        xty = np.asarray(state['xty']) + xty
+        coef = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+        candidate.intercept_, candidate.coef_ = coef[0], coef[1:]
+        state['xtx'], state['xty'] = xtx.tolist(), xty.tolist()
+        print("Régression linéaire : coefficients mis à jour.")
+
+    # 4. Validation avant sauvegarde
+    y_pred_val = candidate.predict(X_val)
+    mse_candidate = mean_squared_error(y_val, y_pred_val)
+    print(f"Validation : MSE actuel={mse_current:.4f}, MSE nouveau={mse_candidate:.4f}")
+
+    if mse_candidate > mse_current * (1 + VALIDATION_TOLERANCE):
+        print("Le nouveau modèle est moins bon sur la validation : il n'est pas sauvegardé.")
+        return
+
+    joblib.dump(candidate, MODEL_PATH)
+    state['watermark'] = int(df['id'].max())
+    state['n_seen'] = n_seen
+    # Empreinte au nouveau watermark : les nouvelles lignes en font désormais partie
+    conn = sqlite3.connect(db_path)
+    state.update(_table_fingerprint(conn, state['watermark']))
+    conn.close()
+    save_training_state(state)
+
+    # Le baseline de dérive intègre les nouvelles lignes et les prédictions du nouveau modèle
+    update_drift_baseline(X_train, candidate.predict(X_train), DRIFT_BASELINE_PATH)
+    print(f"Modèle sauvegardé dans : {MODEL_PATH} (watermark id={state['watermark']})")
+
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Entraînement du modèle de qualité du vin.")
+    parser.add_argument('--incremental', action='store_true', help="Met à jour le modèle avec les seules nouvelles lignes.")
+    args = parser.parse_args()
+
+    if args.incremental:
+        train_incremental()
+    else:
+        train()
@@ -0,0 +1,26 @@
+import json
+import joblib
+import pytest
+from sklearn.dummy import DummyRegressor
+
+def save_constant_model(path, value):
+    """Sauvegarde un modèle qui prédit toujours `value`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model = DummyRegressor(strategy="constant", constant=value).fit([[0.0]], [value])
+    joblib.dump(model, path)
+
+@pytest.fixture
+def models_dir(tmp_path):
+    """Fixture : répertoire de modèles constants (un par version) et règles de sélection."""
+    directory = tmp_path / "models"
+    save_constant_model(directory / "default" / "v1.joblib", 5.0)
+    save_constant_model(directory / "bordeaux" / "v2.joblib", 6.0)
+    save_constant_model(directory / "bordeaux" / "v10.joblib", 7.0)
+    save_constant_model(directory / "bourgogne" / "v1.joblib", 8.0)
+    (directory / "registry.json").write_text(json.dumps({"routes": [
+        {"model": "bordeaux@v2", "region": "Bordeaux", "vintage_max": 2012},
+        {"model": "bordeaux", "region": "Bordeaux"},
+        {"model": "bourgogne", "region": "Bourgogne"},
+        {"model": "absent", "region": "Alsace"},
+    ]}))
+    return directory
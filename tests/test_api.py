@@ -1,5 +1,10 @@
+import re
+import shutil
+import pytest
 from fastapi.testclient import TestClient
+import src.api_model as api_model
 from src.api_model import app
+from src.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, CachedStaticFiles
 
 def test_read_root():
     """Vérifie que la route racine renvoie la page HTML (status 200)."""
@@ -34,3 +39,105 @@ def test_predict_endpoint():
         data = response.json()
         assert "predicted_quality" in data
         assert isinstance(data["predicted_quality"], float)
+
+@pytest.fixture
+def payload():
+    """Fixture : caractéristiques JSON d'un vin valide."""
+    return {
+        "fixed_acidity": 7.4,
+        "volatile_acidity": 0.7,
+        "citric_acid": 0.0,
+        "residual_sugar": 1.9,
+        "chlorides": 0.076,
+        "free_sulfur_dioxide": 11.0,
+        "total_sulfur_dioxide": 34.0,
+        "density": 0.9978,
+        "pH": 3.51,
+        "sulphates": 0.56,
+        "alcohol": 9.4,
+        "temperature": 15.0,
+        "rain": 0.0
+    }
+
+def test_read_root_static_cache(monkeypatch, tmp_path):
+    """Vérifie le mode ELYOS_STATIC_CACHE : page rendue au démarrage, ETag, URL versionnée et précompression."""
+    static_dir = tmp_path / "static"
+    shutil.copytree("static", static_dir)
+    # Le montage est choisi à l'import : on monte ce que produirait ELYOS_STATIC_CACHE=1
+    static_files = CachedStaticFiles(directory=str(static_dir))
+    mount = next(route for route in app.routes if getattr(route, "name", None) == "static")
+    monkeypatch.setattr(mount, "app", static_files)
+    monkeypatch.setattr(api_model, "static_files", static_files)
+    monkeypatch.setattr(api_model, "STATIC_CACHE", True)
+    monkeypatch.setattr(api_model, "STATIC_DIR", str(static_dir))
+    monkeypatch.setattr(api_model, "index_page", None)
+    monkeypatch.setitem(api_model.templates.env.globals, "static_url", api_model.templates.env.globals["static_url"])
+
+    with TestClient(app) as client:
+        response = client.get("/", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        css_url = re.search(r'/static/css/style\.css\?v=\w+', response.text).group(0)
+        assert (static_dir / "css" / "style.css.gz").exists()
+
+        response = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+
+        response = client.get(css_url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.content == (static_dir / "css" / "style.css").read_bytes()
+
+        response = client.get("/static/css/style.css", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+def test_predict_profiling_header(payload, monkeypatch):
+    """Vérifie que seul l'en-tête portant le secret déclenche le profilage (durées par étape)."""
+    monkeypatch.setattr(api_model.profiler, "token", b"secret")
+
+    with TestClient(app) as client:
+        response = client.post("/predict", json=payload)
+        assert "server-timing" not in response.headers
+
+        response = client.post("/predict", json=payload, headers={"X-Elyos-Profile": "0"})
+        assert "server-timing" not in response.headers
+
+        response = client.post("/predict", json=payload, headers={"X-Elyos-Profile": "secret"})
+        assert response.status_code == 200
+        assert "predict;dur=" in response.headers["server-timing"]
+        assert "validation;dur=" in response.headers["server-timing"]
+
+def test_predict_batch_endpoint(payload, models_dir, tmp_path, monkeypatch):
+    """Vérifie que l'endpoint par lot choisit le modèle de chaque vin et garde l'ordre des lignes."""
+    monkeypatch.setattr(api_model, "MODELS_DIR", str(models_dir))
+    monkeypatch.setattr(api_model, "MODEL_USAGE_PATH", str(tmp_path / "usage.json"))
+    batch = [
+        {**payload, "region": "Bourgogne"},
+        payload,
+        {**payload, "region": "Bordeaux", "vintage": 2015},
+        {**payload, "region": "Bordeaux", "vintage": 2010},
+        {**payload, "region": "Bourgogne"},
+    ]
+
+    with TestClient(app) as client:
+        response = client.post("/predict/batch", json=batch)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["predicted_quality"] == [8.0, 5.0, 7.0, 6.0, 8.0]
+        assert data["models"] == ["bourgogne@v1", "default@v1", "bordeaux@v10", "bordeaux@v2", "bourgogne@v1"]
+
+def test_predict_survives_drift_error(payload, monkeypatch):
+    """Vérifie qu'une erreur du suivi de dérive ne fait pas échouer une prédiction réussie."""
+    class BrokenMonitor:
+        def update(self, row, prediction):
+            raise RuntimeError("monitoring indisponible")
+
+        def stop(self):
+            pass
+
+    with TestClient(app) as client:
+        monkeypatch.setattr(api_model, "drift_monitor", BrokenMonitor())
+        response = client.post("/predict", json=payload)
+
+        assert response.status_code == 200
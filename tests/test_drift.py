@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from src.drift import STALE_FLUSHES, DriftMonitor
+
+@pytest.fixture
+def baseline():
+    """Baseline minimal : une variable uniforme sur [0, 1] (10 bins) et la prédiction."""
+    edges = np.linspace(0, 1, 11)[1:-1].tolist()
+    return {
+        "features": ["alcohol", "prediction"],
+        "edges": [edges, edges],
+        "proportions": [[0.1] * 10, [0.1] * 10],
+        "mean": [0.5, 0.5],
+        "std": [0.29, 0.29],
+        "count": 1000,
+    }
+
+def test_drift_stable(baseline, tmp_path):
+    """Vérifie les statistiques en ligne sur des données conformes au baseline."""
+    monitor = DriftMonitor(baseline, directory=str(tmp_path))
+    rng = np.random.default_rng(0)
+    for value in rng.uniform(0, 1, 5000):
+        monitor.update({"alcohol": value}, value)
+
+    report = monitor.report()
+
+    assert report["count"] == 5000
+    assert report["status"] == "stable"
+    assert abs(report["features"]["alcohol"]["mean"] - 0.5) < 0.02
+    assert abs(report["features"]["alcohol"]["quantiles"]["p50"] - 0.5) < 0.05
+
+def test_drift_detected(baseline, tmp_path):
+    """Vérifie qu'un décalage de distribution donne un PSI significatif."""
+    monitor = DriftMonitor(baseline, directory=str(tmp_path))
+    for value in np.linspace(0.8, 1.2, 1000):
+        monitor.update({"alcohol": value}, 0.5)
+
+    report = monitor.report()
+
+    assert report["status"] == "significant"
+    assert report["features"]["alcohol"]["mean_shift_z"] > 1
+
+def test_drift_merge_ignores_stale_and_foreign_states(baseline, tmp_path):
+    """Vérifie que seuls les états récents calculés sur le même baseline sont fusionnés."""
+    other_worker = DriftMonitor(baseline, directory=str(tmp_path))
+    other_worker.update({"alcohol": 0.5}, 0.5)
+    other_worker.flush()
+
+    old_worker = DriftMonitor(baseline, directory=str(tmp_path))
+    old_worker.update({"alcohol": 0.5}, 0.5)
+    old_worker.boot_id = "ancien"
+    old_worker.flush()
+    old_path = tmp_path / f"worker_{os.getpid()}_ancien.json"
+    old_mtime = old_path.stat().st_mtime - (STALE_FLUSHES + 1) * old_worker.flush_interval
+    os.utime(old_path, (old_mtime, old_mtime))
+
+    # État d'un autre baseline, avec un nombre de bins différent
+    foreign = {"count": 1, "mean": [0, 0], "m2": [0, 0], "min": [0, 0], "max": [0, 0], "hist": [[1] * 5, [1] * 5], "baseline_hash": "autre"}
+    (tmp_path / "worker_1_autre.json").write_text(json.dumps(foreign))
+    foreign["baseline_hash"] = other_worker.baseline_hash
+    (tmp_path / "worker_2_forme.json").write_text(json.dumps(foreign))
+
+    monitor = DriftMonitor(baseline, directory=str(tmp_path))
+    monitor.update({"alcohol": 0.5}, 0.5)
+
+    assert monitor.report()["count"] == 2
+    assert not old_path.exists()
+
+def test_drift_update_batch(baseline, tmp_path):
+    """Vérifie que la mise à jour par lot donne les mêmes statistiques que ligne par ligne."""
+    rng = np.random.default_rng(1)
+    values = rng.uniform(-0.2, 1.2, 500)
+    predictions = rng.uniform(0, 1, 500)
+    row_monitor = DriftMonitor(baseline, directory=str(tmp_path / "rows"))
+    batch_monitor = DriftMonitor(baseline, directory=str(tmp_path / "batch"))
+
+    for value, prediction in zip(values, predictions):
+        row_monitor.update({"alcohol": value}, prediction)
+    batch_monitor.update({"alcohol": values[0]}, predictions[0])
+    batch_monitor.update_batch(pd.DataFrame({"alcohol": values[1:300]}), predictions[1:300])
+    batch_monitor.update_batch(pd.DataFrame({"alcohol": values[300:]}), predictions[300:])
+
+    expected, actual = row_monitor.merged_state(), batch_monitor.merged_state()
+    assert actual["count"] == expected["count"] == 500
+    assert np.array_equal(actual["hist"], expected["hist"])
+    for key in ("mean", "m2", "min", "max"):
+        assert np.allclose(actual[key], expected[key])
+
+def test_drift_shards_bounded(baseline, tmp_path):
+    """Vérifie que des threads recyclés (rafales successives) n'ajoutent pas de shards."""
+    monitor = DriftMonitor(baseline, directory=str(tmp_path), n_shards=4)
+
+    for _ in range(3):
+        threads = [threading.Thread(target=monitor.update, args=({"alcohol": 0.5}, 0.5)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(monitor._shards) == 4
+    assert monitor.merged_state()["count"] == 60
@@ -1,8 +1,15 @@
 import joblib
+import json
+import numpy as np
 import pandas as pd
 import os
 import pytest
+import sqlite3
+from sklearn.linear_model import LinearRegression
+from src import train_model
 from src.api_model import WineFeatures
+from src.train_model import FEATURES, _linear_stats
+from data_pipeline.src.process_and_load import save_to_db
 
 # Chemin vers le modèle
 MODEL_PATH = "models/best_model.joblib"
@@ -44,3 +51,111 @@ def test_model_prediction(model):
     assert len(prediction) == 1
     assert isinstance(prediction[0], float)
     assert 0 <= prediction[0] <= 10  # Note de qualité du vin entre 0 et 10
+
+def test_linear_stats_incremental():
+    """Vérifie que la mise à jour par lots (X'X, X'y) donne la même régression qu'un entraînement complet."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    y = pd.Series(X @ [1.0, -2.0, 0.5] + 3.0 + rng.normal(scale=0.1, size=200))
+
+    xtx_old, xty_old = _linear_stats(X[:150], y[:150])
+    xtx_new, xty_new = _linear_stats(X[150:], y[150:])
+    coef = np.linalg.lstsq(xtx_old + xtx_new, xty_old + xty_new, rcond=None)[0]
+
+    reference = LinearRegression().fit(X, y)
+    assert np.allclose(coef[0], reference.intercept_)
+    assert np.allclose(coef[1:], reference.coef_)
+
+def make_wines(n, seed):
+    """Vins synthétiques dont la qualité dépend de seuils, bruitée (favorise la Random Forest)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(0, 1, size=(n, len(FEATURES))), columns=FEATURES)
+    # Un peu de bruit : la MSE de validation du modèle actuel n'est jamais nulle
+    df["quality"] = 5 + 2 * (df["alcohol"] > 0.5) + (df["pH"] > 0.3) + rng.normal(0, 0.3, n)
+    df["year"] = 2015
+    return df
+
+@pytest.fixture
+def training_dir(tmp_path, monkeypatch):
+    """Fixture : répertoire de travail avec une base vins_enrichis de 200 lignes et un premier entraînement."""
+    monkeypatch.chdir(tmp_path)
+    save_to_db(make_wines(200, seed=0), pd.DataFrame({"pays": ["France"], "volume_production": [1]}), "data_pipeline/data/viti_quality.db")
+    train_model.train()
+    return tmp_path
+
+def read_state():
+    with open(train_model.STATE_PATH) as f:
+        return json.load(f)
+
+def append_wines(df):
+    conn = sqlite3.connect("data_pipeline/data/viti_quality.db")
+    df.to_sql("vins_enrichis", conn, if_exists="append", index=False)
+    conn.close()
+
+def test_incremental_no_new_rows(training_dir, capsys):
+    """Vérifie qu'un entraînement incrémental sans nouvelles lignes ne modifie rien."""
+    state = read_state()
+
+    train_model.train_incremental()
+
+    assert "Aucune nouvelle donnée" in capsys.readouterr().out
+    assert read_state() == state
+
+def test_incremental_grows_forest(training_dir, capsys, monkeypatch):
+    """Vérifie le watermark, la séparation id % 5 et l'ajout d'arbres plafonné par MAX_TREES."""
+    monkeypatch.setattr(train_model, "VALIDATION_TOLERANCE", 10.0)
+    monkeypatch.setattr(train_model, "MAX_TREES", 105)
+    assert read_state()["model"] == "random_forest"
+    baseline_before = json.loads((training_dir / "models" / "drift_baseline.json").read_text())
+
+    append_wines(make_wines(150, seed=1))
+    train_model.train_incremental()
+
+    assert "150 nouvelles lignes (Train 120 / Validation 30)" in capsys.readouterr().out
+    state = read_state()
+    assert state["watermark"] == 350
+    assert state["n_seen"] == 160 + 120
+    model = joblib.load(train_model.MODEL_PATH)
+    assert model.n_estimators == len(model.estimators_) == 105
+    baseline = json.loads((training_dir / "models" / "drift_baseline.json").read_text())
+    assert baseline["count"] == baseline_before["count"] + 120
+
+    # Second tour sur une forêt tronquée : aucun nouvel arbre ne reprend la graine d'un arbre conservé
+    append_wines(make_wines(150, seed=2))
+    train_model.train_incremental()
+
+    model = joblib.load(train_model.MODEL_PATH)
+    assert read_state()["watermark"] == 500
+    assert len({tree.random_state for tree in model.estimators_}) == len(model.estimators_)
+
+def test_incremental_defers_small_holdout(training_dir, capsys):
+    """Vérifie qu'avec trop peu de lignes de validation, la décision est reportée."""
+    state = read_state()
+
+    append_wines(make_wines(50, seed=1))
+    train_model.train_incremental()
+
+    assert "mise à jour reportée" in capsys.readouterr().out
+    assert read_state() == state
+
+def test_incremental_rejects_worse_model(training_dir, capsys, monkeypatch):
+    """Vérifie qu'un modèle refusé à la validation n'est pas sauvegardé (watermark inchangé)."""
+    monkeypatch.setattr(train_model, "VALIDATION_TOLERANCE", -1.0)
+    state = read_state()
+
+    append_wines(make_wines(150, seed=1))
+    train_model.train_incremental()
+
+    assert "n'est pas sauvegardé" in capsys.readouterr().out
+    assert read_state() == state
+    assert joblib.load(train_model.MODEL_PATH).n_estimators == 100
+
+def test_incremental_detects_recreated_table(training_dir, capsys):
+    """Vérifie qu'une table recréée par le pipeline (id repartant de 1) relance un entraînement complet."""
+    fingerprint = read_state()["fingerprint"]
+
+    save_to_db(make_wines(200, seed=2), pd.DataFrame({"pays": ["France"], "volume_production": [1]}), "data_pipeline/data/viti_quality.db")
+    train_model.train_incremental()
+
+    assert "La table a été recréée" in capsys.readouterr().out
+    assert read_state()["fingerprint"] != fingerprint
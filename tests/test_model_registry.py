@@ -0,0 +1,78 @@
+import json
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pytest
+from src import model_registry
+from src.model_registry import ModelRegistry
+
+@pytest.fixture
+def registry(models_dir, tmp_path):
+    """Fixture : registre sur les modèles constants, avec compteurs d'utilisation sur disque."""
+    return ModelRegistry(str(models_dir), usage_path=str(tmp_path / "usage.json"))
+
+def test_registry_resolve(registry):
+    """Vérifie le choix du modèle : règles, dernière version et modèle par défaut."""
+    assert registry.resolve("Bordeaux", vintage=2010) == "bordeaux@v2"
+    assert registry.resolve("Bordeaux", vintage=2015) == "bordeaux@v10"
+    assert registry.resolve("Bourgogne") == "bourgogne@v1"
+    assert registry.resolve("Alsace") == "default@v1"
+    # Règle vers un modèle absent ignorée, et aucun modèle chargé avant utilisation
+    assert len(registry.routes) == 3
+    assert registry.info()["loaded"] == []
+
+def test_registry_lru_eviction(registry):
+    """Vérifie que le cache ne dépasse pas la mémoire autorisée (ici : un seul modèle)."""
+    registry.max_bytes = 1
+
+    registry.get("bordeaux@v10")
+    registry.get("bourgogne@v1")
+
+    assert registry.info()["loaded"] == ["bourgogne@v1"]
+    assert registry.info()["cache_mb"] > 0
+
+def test_registry_batch_predict(registry):
+    """Vérifie qu'un lot mélangeant plusieurs modèles garde l'ordre des lignes."""
+    df = pd.DataFrame({"x": [0.0, 0.0, 0.0, 0.0]})
+    keys = ["bourgogne@v1", "default@v1", "bourgogne@v1", "bordeaux@v10"]
+
+    predictions = registry.predict(df, keys)
+
+    assert np.array_equal(predictions, [8.0, 5.0, 8.0, 7.0])
+    assert registry.usage["bourgogne@v1"] == 2
+
+def test_registry_save_usage_merges_workers(registry, models_dir):
+    """Vérifie que les compteurs de plusieurs workers s'additionnent sans double comptage."""
+    other_worker = ModelRegistry(str(models_dir), usage_path=registry.usage_path)
+
+    registry.get("bourgogne@v1", rows=3)
+    other_worker.get("bourgogne@v1", rows=2)
+    registry.save_usage()
+    other_worker.save_usage()
+    # Un second enregistrement sans nouvelle utilisation ne change rien
+    registry.save_usage()
+
+    with open(registry.usage_path) as f:
+        assert json.load(f) == {"bourgogne@v1": 5}
+    assert ModelRegistry(str(models_dir), usage_path=registry.usage_path).usage["bourgogne@v1"] == 5
+
+def save_usage_after_barrier(models_dir, usage_path, barrier):
+    worker = ModelRegistry(models_dir, usage_path=usage_path)
+    worker.get("bourgogne@v1")
+    barrier.wait()
+    worker.save_usage()
+
+@pytest.mark.skipif(model_registry.fcntl is None, reason="flock indisponible sur cette plateforme")
+def test_registry_save_usage_concurrent(registry, models_dir):
+    """Vérifie qu'aucun compteur n'est perdu quand tous les workers s'arrêtent en même temps."""
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(8)
+    workers = [context.Process(target=save_usage_after_barrier, args=(str(models_dir), registry.usage_path, barrier))
+               for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with open(registry.usage_path) as f:
+        assert json.load(f) == {"bourgogne@v1": 8}
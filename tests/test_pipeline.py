@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from data_pipeline.src.process_and_load import GROWING_SEASON_NORTH, GROWING_SEASON_SOUTH, clean_aggregate_meteo, merge_data
+
+@pytest.fixture
+def meteo():
+    """Deux stations dans une région, une station dans une autre, sur deux années complètes."""
+    dates = pd.date_range("2010-01-01", "2011-12-31", freq="D").strftime("%Y-%m-%d")
+    stations = [("merignac", "Bordeaux", 10.0), ("cognac", "Bordeaux", 12.0), ("dijon", "Bourgogne", 8.0)]
+    return pd.DataFrame({
+        "time": np.tile(dates, len(stations)),
+        "station": np.repeat([s[0] for s in stations], len(dates)),
+        "region": np.repeat([s[1] for s in stations], len(dates)),
+        "temperature_2m_mean": np.repeat([s[2] for s in stations], len(dates)),
+        "rain_sum": 1.0,
+    })
+
+def test_aggregate_multi_station(meteo):
+    """Vérifie la moyenne par région : la pluie est cumulée par station puis moyennée."""
+    df_agg = clean_aggregate_meteo(meteo)
+    bordeaux_2010 = df_agg[(df_agg["region"] == "Bordeaux") & (df_agg["year"] == 2010)].iloc[0]
+
+    assert len(df_agg) == 4
+    assert bordeaux_2010["temperature_2m_mean"] == 11.0
+    assert bordeaux_2010["rain_sum"] == 365.0
+
+def test_aggregate_growing_season(meteo):
+    """Vérifie les fenêtres saisonnières, y compris à cheval sur deux années."""
+    df_north = clean_aggregate_meteo(meteo.copy(), window=GROWING_SEASON_NORTH)
+    assert set(df_north["rain_sum"]) == {214.0}  # 1er avril -> 31 octobre
+
+    # Seul le millésime 2011 (octobre 2010 -> avril 2011) est complet : 2010 et 2012 sont écartés
+    df_south = clean_aggregate_meteo(meteo.copy(), window=GROWING_SEASON_SOUTH)
+    assert set(df_south["year"]) == {2011}
+    assert set(df_south["rain_sum"]) == {92.0 + 120.0}
+
+def test_aggregate_drops_partial_year(meteo):
+    """Vérifie qu'une année civile incomplète pour une station est écartée."""
+    partial = meteo[~((meteo["station"] == "dijon") & (meteo["time"] >= "2011-07-01"))]
+
+    df_agg = clean_aggregate_meteo(partial.copy())
+
+    assert df_agg[df_agg["region"] == "Bourgogne"]["year"].tolist() == [2010]
+
+def test_merge_region_vintage(meteo):
+    """Vérifie la jointure vin -> région/millésime et les millésimes sans météo (NaN)."""
+    df_agg = clean_aggregate_meteo(meteo)
+    df_wine = pd.DataFrame({"alcohol": [9.4, 10.0, 11.0], "region": ["Bourgogne", "Bordeaux", "Bordeaux"], "year": [2011, 2010, 2015]})
+
+    merged = merge_data(df_wine, df_agg)
+
+    assert list(merged["alcohol"]) == [9.4, 10.0, 11.0]
+    assert list(merged["temperature_2m_mean"][:2]) == [8.0, 11.0]
+    assert np.isnan(merged["rain_sum"].iloc[2])
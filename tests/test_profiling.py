@@ -0,0 +1,33 @@
+import json
+import os
+from src.profiling import ProfileSession, ProfilingMiddleware, RequestProfiler
+
+def make_session(started_at):
+    session = ProfileSession(sample_interval=0.001)
+    session.started_at = started_at
+    session.finish()
+    return session
+
+def test_profiler_threshold(tmp_path):
+    """Vérifie que seules les requêtes plus lentes que le seuil sont enregistrées."""
+    profiler = RequestProfiler(paths=["/predict"], threshold_ms=1e9, directory=str(tmp_path))
+    middleware = ProfilingMiddleware(app=None, profiler=profiler)
+
+    middleware._complete(make_session(1000.0), "/predict")
+    assert os.listdir(tmp_path) == []
+
+    profiler.threshold_ms = 0
+    middleware._complete(make_session(1001.0), "/predict")
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_profiler_dump_ring_buffer(tmp_path):
+    """Vérifie que le buffer circulaire ne garde que les max_files profils les plus récents."""
+    profiler = RequestProfiler(paths=["/predict"], threshold_ms=0, directory=str(tmp_path), max_files=2)
+
+    for started_at in (1000.0, 1001.0, 1002.0):
+        profiler.dump(make_session(started_at), "/predict")
+
+    files = sorted(os.listdir(tmp_path))
+    assert [name.split("_")[1] for name in files] == ["1001.000000", "1002.000000"]
+    with open(tmp_path / files[-1]) as f:
+        assert json.load(f)["path"] == "/predict"
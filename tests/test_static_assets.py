@@ -0,0 +1,90 @@
+import gzip
+import os
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from src.static_assets import (
+    IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, CachedPage, CachedStaticFiles,
+    accepted_encodings, accepts_encoding, build_static_assets, make_static_url,
+)
+
+CSS = b"body { color: red; }"
+
+def make_request(headers):
+    raw_headers = [(k.encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw_headers})
+
+def test_accepted_encodings():
+    """Vérifie la lecture des q-values d'Accept-Encoding (q=0 = refusé)."""
+    qvalues = accepted_encodings("gzip;q=0, br;q=0.8, *;q=0.1")
+
+    assert not accepts_encoding(qvalues, "gzip")
+    assert accepts_encoding(qvalues, "br")
+    assert accepts_encoding(qvalues, "deflate")
+    assert not accepts_encoding(accepted_encodings(""), "gzip")
+
+def test_cached_page_etag():
+    """Vérifie que la page en cache renvoie un 304 si l'ETag du client est à jour."""
+    page = CachedPage("<html>Élyos</html>")
+
+    response = page.response(make_request({}))
+    assert response.status_code == 200
+    assert response.headers["etag"] == page.etag
+
+    response = page.response(make_request({"if-none-match": page.etag}))
+    assert response.status_code == 304
+
+    # La variante gzip a son propre ETag
+    response = page.response(make_request({"accept-encoding": "gzip, br"}))
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == page.gzip_etag != page.etag
+
+    response = page.response(make_request({"accept-encoding": "gzip;q=0"}))
+    assert "content-encoding" not in response.headers
+
+def test_build_static_assets(tmp_path):
+    """Vérifie la génération des variantes gzip et du manifeste de hashes."""
+    css_dir = tmp_path / "css"
+    css_dir.mkdir()
+    (css_dir / "style.css").write_bytes(CSS)
+
+    manifest = build_static_assets(str(tmp_path))
+
+    assert "css/style.css" in manifest
+    assert gzip.decompress((css_dir / "style.css.gz").read_bytes()) == CSS
+    assert make_static_url(manifest)("css/style.css").startswith("/static/css/style.css?v=")
+
+def test_cached_static_files(tmp_path):
+    """Vérifie le service des variantes précompressées et les en-têtes de cache."""
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "style.css").write_bytes(CSS)
+    manifest = build_static_assets(str(tmp_path))
+    app = Starlette(routes=[Mount("/static", CachedStaticFiles(directory=str(tmp_path), manifest=manifest))])
+    url = make_static_url(manifest)("css/style.css")
+
+    with TestClient(app) as client:
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["content-type"].startswith("text/css")
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.content == CSS
+
+        response = client.get("/static/css/style.css?v=autre", headers={"Accept-Encoding": "gzip;q=0"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+        assert response.content == CSS
+
+def test_cached_static_files_skips_stale_variant(tmp_path):
+    """Vérifie qu'une variante plus ancienne que la source modifiée n'est pas servie."""
+    (tmp_path / "style.css").write_bytes(CSS)
+    build_static_assets(str(tmp_path))
+    (tmp_path / "style.css").write_bytes(b"body { color: blue; }")
+    mtime = os.path.getmtime(tmp_path / "style.css.gz")
+    os.utime(tmp_path / "style.css", (mtime + 10, mtime + 10))
+    app = Starlette(routes=[Mount("/static", CachedStaticFiles(directory=str(tmp_path)))])
+
+    with TestClient(app) as client:
+        response = client.get("/static/style.css", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.content == b"body { color: blue; }"